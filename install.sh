@@ -43,9 +43,18 @@ fi
 echo ""
 echo "Installing daemon..."
 mkdir -p "$INSTALL_DIR"
-cp "$SCRIPT_DIR/super_activity_daemon.py" "$INSTALL_DIR/"
+# Preserve mtimes so the daemon can tell whether a compiled build is current
+cp -p "$SCRIPT_DIR/super_activity_daemon.py" "$INSTALL_DIR/"
 chmod +x "$INSTALL_DIR/super_activity_daemon.py"
 
+# Install the optional compiled daemon module (see setup.py), replacing any stale build
+rm -f "$INSTALL_DIR"/super_activity_daemon.*.so
+# (the daemon itself ignores a build older than its script)
+if compgen -G "$SCRIPT_DIR/super_activity_daemon.*.so" > /dev/null; then
+    echo "Installing compiled daemon module..."
+    cp -p "$SCRIPT_DIR"/super_activity_daemon.*.so "$INSTALL_DIR/"
+fi
+
 # Install configuration GUI
 echo "Installing configuration GUI..."
 cp "$SCRIPT_DIR/super-activity-config.py" "$INSTALL_DIR/"
@@ -72,6 +81,21 @@ chmod +x "/usr/lib/systemd/system-sleep/super-activity-view"
 echo "Installing systemd service..."
 cp "$SCRIPT_DIR/super-activity-view.service" "$SERVICE_FILE"
 
+# Record the installing user so the daemon can find their config
+if [ -n "$SUDO_USER" ]; then
+    sed -i "/^\[Service\]/a Environment=SUPER_ACTIVITY_VIEW_USER=$SUDO_USER" "$SERVICE_FILE"
+else
+    echo ""
+    echo "WARNING: Could not determine your user (not run via sudo)."
+    echo "  The daemon will not see settings saved by the configuration GUI and"
+    echo "  will use /etc/super-activity-view/config.json instead. To fix, run:"
+    echo "    sudo systemctl edit super-activity-view.service"
+    echo "  and add:"
+    echo "    [Service]"
+    echo "    Environment=SUPER_ACTIVITY_VIEW_USER=<your user name>"
+    echo ""
+fi
+
 # Reload systemd
 echo "Reloading systemd..."
 systemctl daemon-reload
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+Optional compiled build of the daemon.
+
+Compiles super_activity_daemon.py to a C extension with Cython, which the
+daemon picks up automatically when it sits next to the script:
+
+    sudo apt install cython3 python3-dev
+    python3 setup.py build_ext --inplace
+
+The plain Python script keeps working when no compiled module is present.
+"""
+
+from setuptools import setup
+from Cython.Build import cythonize
+
+setup(
+    name="super-activity-view",
+    ext_modules=cythonize(
+        "super_activity_daemon.py",
+        compiler_directives={"language_level": "3"},
+    ),
+)
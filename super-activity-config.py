@@ -12,10 +12,17 @@ gi.require_version('Adw', '1')
 from gi.repository import Gtk, Adw, GLib, Gio
 import json
 import os
-import subprocess
+import pickle
 import sys
+import time
 
 CONFIG_PATH = os.path.expanduser("~/.config/super-activity-view/config.json")
+# Parsed config keyed by the JSON file's identity, to skip re-parsing on launch
+CONFIG_CACHE_PATH = os.path.join(os.path.dirname(CONFIG_PATH), "config.cache.pickle")
+
+def config_stat_key(st):
+    """Identify a version of the config file (mtime alone survives cp -p etc.)."""
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
 SERVICE_NAME = "super-activity-view.service"
 
 # Key options for trigger and injection
@@ -38,6 +45,9 @@ class SuperActivityConfig(Adw.Application):
             "tap_timeout": 0.5
         }
         self._save_timeout_id = None  # For debouncing saves
+        self._subproc_cache = {}  # tuple(args) -> (timestamp, stdout)
+        self._subproc_pending = {}  # tuple(args) -> [callbacks] while running
+        self._cache_generation = 0  # Bumped whenever the service state changes
         self.load_config()
         
         # Register actions for toast buttons
@@ -48,51 +58,163 @@ class SuperActivityConfig(Adw.Application):
     def load_config(self):
         """Load configuration from file."""
         try:
-            if os.path.exists(CONFIG_PATH):
-                with open(CONFIG_PATH, 'r') as f:
-                    self.config.update(json.load(f))
+            stat_key = config_stat_key(os.stat(CONFIG_PATH))
+        except FileNotFoundError:
+            return
+        except PermissionError as e:
+            print(f"Could not load config: {e}")
+            return
+        
+        cached = self._load_config_cache(stat_key)
+        if cached is not None:
+            self.config.update(cached)
+            return
+        
+        try:
+            with open(CONFIG_PATH, 'r') as f:
+                loaded = json.load(f)
+            self.config.update(loaded)
+            self._write_config_cache(stat_key, loaded)
         except (PermissionError, json.JSONDecodeError) as e:
             print(f"Could not load config: {e}")
     
+    def _load_config_cache(self, stat_key):
+        """Return the cached config dict if it matches stat_key, else None."""
+        try:
+            with open(CONFIG_CACHE_PATH, 'rb') as f:
+                cached_stat_key, cached_config = pickle.load(f)
+        except Exception:
+            return None
+        if cached_stat_key != stat_key or not isinstance(cached_config, dict):
+            return None
+        return cached_config
+    
+    def _write_config_cache(self, stat_key, config):
+        """Store the parsed config alongside the JSON file (best effort)."""
+        try:
+            with open(CONFIG_CACHE_PATH, 'wb') as f:
+                pickle.dump((stat_key, dict(config)), f)
+        except OSError as e:
+            print(f"Could not write config cache: {e}")
+    
     def save_config(self):
         """Save configuration to user config file."""
         try:
+            new_bytes = json.dumps(self.config, indent=2).encode()
+            
+            # Skip the write entirely if the file already has these contents
+            if os.path.exists(CONFIG_PATH):
+                with open(CONFIG_PATH, 'rb') as f:
+                    if f.read() == new_bytes:
+                        return True
+            
             os.makedirs(os.path.dirname(CONFIG_PATH), exist_ok=True)
-            with open(CONFIG_PATH, 'w') as f:
-                json.dump(self.config, f, indent=2)
+            with open(CONFIG_PATH, 'wb') as f:
+                f.write(new_bytes)
+            self._write_config_cache(config_stat_key(os.stat(CONFIG_PATH)), self.config)
             return True
         except Exception as e:
             print(f"Failed to save config: {e}")
             return False
     
-    def get_service_status(self):
-        """Get the current service status."""
+    def _run_async(self, args, callback=None):
+        """Run a command without blocking the main loop.
+        
+        callback(success, stdout) is invoked on the main loop once the
+        process has exited.
+        """
+        def on_finished(proc, res):
+            try:
+                _, stdout, _ = proc.communicate_utf8_finish(res)
+                success = proc.get_successful()
+            except GLib.Error as e:
+                print(f"Command {' '.join(args)} failed: {e.message}")
+                stdout, success = "", False
+            if callback:
+                callback(success, stdout or "")
+        
         try:
-            result = subprocess.run(
-                ['systemctl', 'is-active', SERVICE_NAME],
-                capture_output=True, text=True
-            )
-            return result.stdout.strip() == "active"
-        except Exception:
-            return False
+            proc = Gio.Subprocess.new(list(args), Gio.SubprocessFlags.STDOUT_PIPE)
+        except GLib.Error as e:
+            print(f"Could not run {' '.join(args)}: {e.message}")
+            if callback:
+                callback(False, "")
+            return
+        proc.communicate_utf8_async(None, None, on_finished)
     
-    def control_service(self, action):
-        """Start, stop, or restart the service."""
-        try:
-            # Use systemctl directly - polkit rule handles authorization
-            subprocess.run(
-                ['systemctl', action, SERVICE_NAME],
-                check=True
+    def _cached_run(self, args, ttl, callback):
+        """Run a command, reusing its stdout if cached less than ttl seconds ago."""
+        key = tuple(args)
+        cached = self._subproc_cache.get(key)
+        if cached and time.monotonic() - cached[0] < ttl:
+            callback(cached[1])
+            return
+        
+        # Share a single process between callers asking while it is running
+        if key in self._subproc_pending:
+            self._subproc_pending[key].append(callback)
+            return
+        callbacks = self._subproc_pending[key] = [callback]
+        generation = self._cache_generation
+        
+        def on_finished(success, stdout):
+            # Output from before an invalidation only goes to its own callers
+            if generation == self._cache_generation:
+                self._subproc_cache[key] = (time.monotonic(), stdout)
+            if self._subproc_pending.get(key) is callbacks:
+                del self._subproc_pending[key]
+            for pending_callback in callbacks:
+                pending_callback(stdout)
+        
+        self._run_async(args, on_finished)
+    
+    def _invalidate_cache(self):
+        """Drop cached command results after the service state was changed.
+        
+        Commands still running were started before the change, so later
+        callers get a fresh process instead of joining them.
+        """
+        self._subproc_cache.clear()
+        self._subproc_pending.clear()
+        self._cache_generation += 1
+    
+    def _query_unit_state(self, callback):
+        """Query active and enabled state with a single systemctl call.
+        
+        Passes {"active": bool, "enabled": bool} to callback.
+        """
+        def on_output(stdout):
+            props = dict(
+                line.split("=", 1) for line in stdout.splitlines() if "=" in line
             )
-            return True
-        except subprocess.CalledProcessError:
-            return False
+            callback({
+                "active": props.get("ActiveState") == "active",
+                "enabled": props.get("UnitFileState") == "enabled",
+            })
+        
+        self._cached_run(
+            ('systemctl', 'show', SERVICE_NAME, '-p', 'ActiveState', '-p', 'UnitFileState'),
+            1.0, on_output
+        )
+    
+    def get_service_status(self, callback):
+        """Get the current service status, passing is_active to callback."""
+        self._query_unit_state(lambda state: callback(state["active"]))
+    
+    def control_service(self, action, callback):
+        """Start, stop, or restart the service, passing success to callback."""
+        # Use systemctl directly - polkit rule handles authorization
+        self._run_async(
+            ('systemctl', action, SERVICE_NAME),
+            lambda success, stdout: callback(success)
+        )
     
     def do_activate(self):
         """Create and show the main window."""
         win = Adw.ApplicationWindow(application=self)
         win.set_title("Super Activity View Configuration")
         win.set_default_size(450, 400)
+        win.connect("close-request", self.on_close_request)
         
         # Toast overlay for notifications (doesn't affect window size)
         self.toast_overlay = Adw.ToastOverlay()
@@ -191,15 +313,19 @@ class SuperActivityConfig(Adw.Application):
         # Status row
         self.status_row = Adw.ActionRow()
         self.status_row.set_title("Service Status")
+        self.status_label = Gtk.Label(label="Checking…")
+        self.status_row.add_suffix(self.status_label)
         self.update_status_display()
         service_group.add(self.status_row)
 
-        # Launch at startup switch
+        # Launch at startup switch (insensitive until the current state is known)
         startup_row = Adw.SwitchRow()
         startup_row.set_title("Launch at Startup")
         startup_row.set_subtitle("Automatically start service on boot")
-        startup_row.set_active(self.get_service_enabled_status())
-        startup_row.connect("notify::active", self.on_startup_toggled)
+        startup_row.set_sensitive(False)
+        self.get_service_enabled_status(
+            lambda is_enabled: self._init_startup_row(startup_row, is_enabled)
+        )
         service_group.add(startup_row)
         
         # Control buttons row
@@ -227,24 +353,24 @@ class SuperActivityConfig(Adw.Application):
         win.present()
     
     def on_trigger_changed(self, row, param, key_names):
-        """Handle trigger key selection change."""
+        """Handle trigger key selection change (debounced)."""
         idx = row.get_selected()
         if idx < len(key_names):
             new_key = KEY_OPTIONS[key_names[idx]]
             if new_key != self.config.get("trigger_key"):
                 self.config["trigger_key"] = new_key
-                self.show_restart_toast()
-                self.save_config()
+                self.needs_restart = True
+                self._schedule_save()
     
     def on_injection_changed(self, row, param, key_names):
-        """Handle injection key selection change."""
+        """Handle injection key selection change (debounced)."""
         idx = row.get_selected()
         if idx < len(key_names):
             new_key = KEY_OPTIONS[key_names[idx]]
             if new_key != self.config.get("injection_key"):
                 self.config["injection_key"] = new_key
-                self.show_restart_toast()
-                self.save_config()
+                self.needs_restart = True
+                self._schedule_save()
     
     def on_timeout_changed(self, row, param):
         """Handle tap timeout value change (debounced)."""
@@ -252,13 +378,28 @@ class SuperActivityConfig(Adw.Application):
         if new_value != self.config.get("tap_timeout"):
             self.config["tap_timeout"] = new_value
             self.needs_restart = True
-            
-            # Cancel any pending save
-            if self._save_timeout_id:
-                GLib.source_remove(self._save_timeout_id)
-            
-            # Debounce: save after 500ms of no changes
-            self._save_timeout_id = GLib.timeout_add(500, self._debounced_save)
+            self._schedule_save()
+    
+    def _schedule_save(self):
+        """Schedule a debounced config save."""
+        # Cancel any pending save
+        if self._save_timeout_id:
+            GLib.source_remove(self._save_timeout_id)
+        
+        # Debounce: save after 500ms of no changes
+        self._save_timeout_id = GLib.timeout_add(500, self._debounced_save)
+    
+    def _flush_pending_save(self):
+        """Write a pending debounced save immediately, if there is one."""
+        if self._save_timeout_id:
+            GLib.source_remove(self._save_timeout_id)
+            self._save_timeout_id = None
+            self.save_config()
+    
+    def on_close_request(self, win):
+        """Save any pending change before the window closes."""
+        self._flush_pending_save()
+        return False  # Let the window close
     
     def _debounced_save(self):
         """Actually save config after debounce delay."""
@@ -290,8 +431,15 @@ class SuperActivityConfig(Adw.Application):
     
     def on_service_action(self, action):
         """Handle service control button click."""
-        if self.control_service(action):
-            GLib.timeout_add(500, self.update_status_display)
+        # Make sure the service starts with the latest settings
+        self._flush_pending_save()
+        self.control_service(action, lambda success: self._on_service_action_done(action, success))
+    
+    def _on_service_action_done(self, action, success):
+        """Refresh status once a service control command has finished."""
+        self._invalidate_cache()
+        self.update_status_display()
+        if success:
             if action == "restart":
                 self.needs_restart = False
                 # Show success toast
@@ -303,50 +451,48 @@ class SuperActivityConfig(Adw.Application):
     
     def update_status_display(self):
         """Update the service status display."""
-        is_active = self.get_service_status()
-        status_text = "Running" if is_active else "Stopped"
-        
-        if hasattr(self, 'status_label') and self.status_label:
-            self.status_label.set_label(status_text)
-            if is_active:
-                self.status_label.remove_css_class("error")
-                self.status_label.add_css_class("success")
-            else:
-                self.status_label.remove_css_class("success")
-                self.status_label.add_css_class("error")
+        self.get_service_status(self._set_status_display)
+    
+    def _set_status_display(self, is_active):
+        """Apply a service status result to the status label."""
+        self.status_label.set_label("Running" if is_active else "Stopped")
+        if is_active:
+            self.status_label.remove_css_class("error")
+            self.status_label.add_css_class("success")
         else:
-            self.status_label = Gtk.Label(label=status_text)
-            self.status_label.add_css_class("success" if is_active else "error")
-            self.status_row.add_suffix(self.status_label)
-        
-        return False
+            self.status_label.remove_css_class("success")
+            self.status_label.add_css_class("error")
     
-    def get_service_enabled_status(self):
-        """Check if the service is enabled."""
-        try:
-            result = subprocess.run(
-                ['systemctl', 'is-enabled', SERVICE_NAME],
-                capture_output=True, text=True
-            )
-            return result.stdout.strip() == "enabled"
-        except Exception:
-            return False
+    def get_service_enabled_status(self, callback):
+        """Check if the service is enabled, passing is_enabled to callback."""
+        self._query_unit_state(lambda state: callback(state["enabled"]))
+    
+    def _init_startup_row(self, row, is_enabled):
+        """Set the initial startup switch state, then start handling toggles."""
+        row.set_active(is_enabled)
+        self._startup_handler_id = row.connect("notify::active", self.on_startup_toggled)
+        row.set_sensitive(True)
 
     def on_startup_toggled(self, row, param):
         """Handle launch at startup toggle."""
         is_enabled = row.get_active()
         action = "enable" if is_enabled else "disable"
         
-        try:
-            # enable/disable requires pkexec (not covered by our polkit rule)
-            subprocess.run(
-                ['pkexec', 'systemctl', action, SERVICE_NAME],
-                check=True
-            )
-        except subprocess.CalledProcessError:
-            # Revert switch if failed
-            row.set_active(not is_enabled)
-            self.show_message("Error", f"Failed to {action} startup service")
+        def on_finished(success, stdout):
+            self._invalidate_cache()
+            row.set_sensitive(True)
+            if not success:
+                # Revert switch if failed (without re-triggering this handler)
+                row.handler_block(self._startup_handler_id)
+                row.set_active(not is_enabled)
+                row.handler_unblock(self._startup_handler_id)
+                self.show_message("Error", f"Failed to {action} startup service")
+        
+        # Block further toggles until pkexec has finished
+        row.set_sensitive(False)
+        
+        # enable/disable requires pkexec (not covered by our polkit rule)
+        self._run_async(('pkexec', 'systemctl', action, SERVICE_NAME), on_finished)
     
     def show_message(self, title, message):
         """Show a message dialog."""
@@ -9,60 +9,149 @@ Supports dynamic device hotplug - automatically detects new keyboards/mice.
 """
 
 import asyncio
+import ctypes
+import functools
+import importlib.machinery
+import importlib.util
 import json
+import logging
 import os
+import pwd
+import signal
+import struct
 import sys
 import time
 from pathlib import Path
 
-# Unbuffered output for systemd journal
-sys.stdout = os.fdopen(sys.stdout.fileno(), 'w', buffering=1)
-sys.stderr = os.fdopen(sys.stderr.fileno(), 'w', buffering=1)
+# Line-buffered output for systemd journal
+sys.stdout.reconfigure(line_buffering=True)
+sys.stderr.reconfigure(line_buffering=True)
+
+# Log to stdout for the journal; LOG_LEVEL=DEBUG also traces every SUPER press
+_log_level = os.environ.get("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(
+    stream=sys.stdout,
+    format="%(message)s",
+    level=_log_level if isinstance(getattr(logging, _log_level, None), int) else logging.INFO,
+)
+logger = logging.getLogger("super-activity-view")
+
+def _load_compiled_module():
+    """Load a compiled build of this module (see setup.py), or return None.
+    
+    A build older than this script (e.g. left behind by a git pull) is
+    skipped, so stale compiled code never shadows the current source.
+    """
+    source = os.path.abspath(__file__)
+    here = os.path.dirname(source)
+    for suffix in importlib.machinery.EXTENSION_SUFFIXES:
+        path = os.path.join(here, "super_activity_daemon" + suffix)
+        if not os.path.exists(path):
+            continue
+        if os.path.getmtime(path) < os.path.getmtime(source):
+            logger.warning("Ignoring compiled daemon %s: older than %s (rebuild with: "
+                           "python3 setup.py build_ext --inplace)",
+                           os.path.basename(path), os.path.basename(source))
+            continue
+        try:
+            spec = importlib.util.spec_from_file_location("super_activity_daemon", path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            logger.info("Using compiled daemon module %s", os.path.basename(path))
+            return module
+        except ImportError as e:
+            logger.warning("Could not load compiled daemon (%s), using Python version", e)
+            return None
+    return None
+
+# When run as a script, hand over to the compiled build if one is installed
+if __name__ == "__main__":
+    _compiled = _load_compiled_module()
+    if _compiled is not None:
+        _compiled.main()
+        sys.exit(0)
 
 try:
     import evdev
     from evdev import ecodes, UInput
 except ImportError:
-    print("Error: evdev module not found. Install with: pip install evdev")
+    logger.error("Error: evdev module not found. Install with: pip install evdev")
     sys.exit(1)
 
+# Event codes used on the hot path, bound once to skip attribute lookups
+_EV_KEY = ecodes.EV_KEY
+_EV_REL = ecodes.EV_REL
+_REL_WHEEL = ecodes.REL_WHEEL
+_REL_HWHEEL = ecodes.REL_HWHEEL
+_KEY_A = ecodes.KEY_A
+_KEY_SPACE = ecodes.KEY_SPACE
+
 try:
     import pyudev
     HAVE_PYUDEV = True
 except ImportError:
     HAVE_PYUDEV = False
-    print("Warning: pyudev not found. Device hotplug detection disabled.")
-    print("Install with: pip install pyudev")
+    logger.warning("Warning: pyudev not found. Falling back to inotify for device hotplug.")
+    logger.warning("Install with: pip install pyudev")
 
 # Config paths - check user config first, then system config
 # When running as root (systemd), we need to find the actual user's config
+USER_CONFIG_SUBPATH = ".config/super-activity-view/config.json"
+
+def _get_home(user=None, uid=None):
+    """Look up a home directory by user name or uid, or None if unknown."""
+    try:
+        if user is not None:
+            return pwd.getpwnam(user).pw_dir
+        return pwd.getpwuid(uid).pw_dir
+    except KeyError:
+        return None
+
+@functools.lru_cache(maxsize=None)
 def get_user_config_paths():
-    """Get possible user config paths, handling root execution."""
-    paths = []
+    """Get possible user config paths, handling root execution (memoized).
+    
+    The desktop user is resolved from the environment rather than by
+    scanning /home: SUPER_ACTIVITY_VIEW_USER (set in the unit by
+    install.sh), the owner of XDG_RUNTIME_DIR, then SUDO_USER.
+    """
+    homes = []
     
     # If running as normal user
-    user_path = os.path.expanduser("~/.config/super-activity-view/config.json")
-    if not user_path.startswith("/root"):
-        paths.append(user_path)
+    user_home = os.path.expanduser("~")
+    if not user_home.startswith("/root"):
+        homes.append(user_home)
+    
+    # User recorded in the systemd unit at install time
+    service_user = os.environ.get("SUPER_ACTIVITY_VIEW_USER")
+    if service_user:
+        homes.append(_get_home(user=service_user))
+    
+    # XDG_RUNTIME_DIR is /run/user/<uid> for the session owner
+    runtime_uid = os.path.basename(os.environ.get("XDG_RUNTIME_DIR", ""))
+    if runtime_uid.isdigit():
+        homes.append(_get_home(uid=int(runtime_uid)))
     
     # Check SUDO_USER environment variable
     sudo_user = os.environ.get("SUDO_USER")
     if sudo_user:
-        paths.append(f"/home/{sudo_user}/.config/super-activity-view/config.json")
-    
-    # Check all users in /home/ (for systemd service running as root)
-    try:
-        for user_dir in os.listdir("/home"):
-            user_config = f"/home/{user_dir}/.config/super-activity-view/config.json"
-            if user_config not in paths:
-                paths.append(user_config)
-    except (PermissionError, FileNotFoundError):
-        pass
+        homes.append(_get_home(user=sudo_user))
     
-    return paths
+    paths = []
+    for home in homes:
+        if home:
+            path = os.path.join(home, USER_CONFIG_SUBPATH)
+            if path not in paths:
+                paths.append(path)
+    return tuple(paths)
 
 SYSTEM_CONFIG_PATH = "/etc/super-activity-view/config.json"
 
+# inotify(7) constants, used for hotplug detection when pyudev is unavailable
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len (name follows)
+
 # Key name to evdev code mapping
 KEY_MAP = {
     "KEY_LEFTMETA": ecodes.KEY_LEFTMETA,
@@ -71,6 +160,40 @@ KEY_MAP = {
     "KEY_RIGHTCTRL": ecodes.KEY_RIGHTCTRL,
 }
 
+# Physical path of our virtual device, used to recognise it during enumeration
+UINPUT_PHYS = "super-activity-daemon"
+
+# struct input_event (timeval, type, code, value) as written to /dev/uinput
+INPUT_EVENT = struct.Struct("llHHi")
+_SYN_REPORT_BYTES = INPUT_EVENT.pack(0, 0, ecodes.EV_SYN, ecodes.SYN_REPORT, 0)
+
+# sysfs capability bitmasks are printed as space-separated hex longs
+_BITS_PER_LONG = ctypes.sizeof(ctypes.c_long) * 8
+
+def _sysfs_has_bit(mask, bit):
+    """Check a bit in a sysfs capability bitmask (most significant word first)."""
+    words = mask.split()
+    index = len(words) - 1 - bit // _BITS_PER_LONG
+    return index >= 0 and bool((int(words[index], 16) >> (bit % _BITS_PER_LONG)) & 1)
+
+def may_be_input_device(path):
+    """Cheaply pre-filter /dev/input/eventN using sysfs, before opening it.
+    
+    Returns False only when the device certainly has neither keyboard keys
+    nor relative axes; if sysfs can't be read, the device is opened anyway.
+    """
+    caps_dir = f"/sys/class/input/{os.path.basename(path)}/device/capabilities"
+    try:
+        with open(f"{caps_dir}/ev") as f:
+            ev_mask = f.read()
+        if _sysfs_has_bit(ev_mask, _EV_REL):
+            return True
+        with open(f"{caps_dir}/key") as f:
+            key_mask = f.read()
+        return _sysfs_has_bit(key_mask, _KEY_A) and _sysfs_has_bit(key_mask, _KEY_SPACE)
+    except (OSError, ValueError):
+        return True
+
 
 class SuperActivityDaemon:
     """Daemon that monitors SUPER key, other keys, and mouse actions."""
@@ -78,29 +201,40 @@ class SuperActivityDaemon:
     # Default maximum time (seconds) between press and release to be considered a "tap"
     DEFAULT_TAP_TIMEOUT = 0.5
     
-    # How often to rescan for new devices (seconds) - fallback if pyudev unavailable
-    DEVICE_SCAN_INTERVAL = 5.0
+    # Default CPUs to pin the daemon to ("cpu_affinity" in config; [] disables)
+    DEFAULT_CPU_AFFINITY = [0]
+    
+    # Maximum number of remembered device classifications
+    DEVICE_CLASS_CACHE_SIZE = 64
+    
+    # Clock used for tap timing (monotonic, unaffected by wall-clock changes)
+    _now = time.monotonic_ns
     
     def __init__(self):
         self.super_pressed = False
         self.super_press_time = 0
         self.other_key_pressed = False
-        self.devices = {}  # path -> device
-        self.device_tasks = {}  # path -> task
+        self.devices = {}  # path -> device (fd registered with the event loop)
+        self._device_class_cache = {}  # hardware identity -> (valid, dtype)
         self.ui = None
+        self._trigger_task = None  # Pending key injection, if any
         self.tap_timeout = self.DEFAULT_TAP_TIMEOUT
-        self.running = False
+        self.cpu_affinity = self.DEFAULT_CPU_AFFINITY
+        self._shutdown = None  # asyncio.Event, created in run() on the daemon's loop
         
         # Load configuration
         self.load_config()
+        self.apply_cpu_affinity()
         
         # Initialize Virtual Input Device
         try:
-            self.ui = UInput(name="Super Activity Daemon")
-            print("Virtual UInput device created successfully")
+            # Only advertise the keys we can inject, not the full keyboard range
+            events = {ecodes.EV_KEY: sorted(set(KEY_MAP.values()))}
+            self.ui = UInput(events=events, name="Super Activity Daemon", phys=UINPUT_PHYS)
+            logger.info("Virtual UInput device created successfully")
         except Exception as e:
-            print(f"Failed to create UInput device: {e}")
-            print("Make sure you are running as root or have access to /dev/uinput")
+            logger.error("Failed to create UInput device: %s", e)
+            logger.error("Make sure you are running as root or have access to /dev/uinput")
     
     def load_config(self):
         """Load configuration from file (user config takes priority)."""
@@ -111,7 +245,7 @@ class SuperActivityDaemon:
         # Determine which config file to use (user config takes priority)
         config_path = None
         # Check user configs first, then system config
-        search_paths = get_user_config_paths() + [SYSTEM_CONFIG_PATH]
+        search_paths = get_user_config_paths() + (SYSTEM_CONFIG_PATH,)
         for path in search_paths:
             if os.path.exists(path):
                 config_path = path
@@ -124,81 +258,140 @@ class SuperActivityDaemon:
                     trigger_key = config.get("trigger_key", trigger_key)
                     injection_key = config.get("injection_key", injection_key)
                     self.tap_timeout = config.get("tap_timeout", self.DEFAULT_TAP_TIMEOUT)
-                    print(f"Loaded config from {config_path}")
-                    print(f"  trigger={trigger_key}, injection={injection_key}, tap_timeout={self.tap_timeout}s")
+                    self.cpu_affinity = config.get("cpu_affinity", self.DEFAULT_CPU_AFFINITY)
+                    logger.info("Loaded config from %s", config_path)
+                    logger.info("  trigger=%s, injection=%s, tap_timeout=%ss",
+                                trigger_key, injection_key, self.tap_timeout)
             except (PermissionError, json.JSONDecodeError) as e:
-                print(f"Could not load config from {config_path}: {e}")
+                logger.warning("Could not load config from %s: %s", config_path, e)
         else:
-            print("No config file found, using defaults")
+            logger.info("No config file found, using defaults")
+        
+        # Convert key names to evdev codes. Only one trigger key is supported,
+        # so handle_event compares against the scalar code directly.
+        self._super_key_code = KEY_MAP.get(trigger_key, ecodes.KEY_LEFTMETA)
+        self._trigger_keys_tuple = (KEY_MAP.get(injection_key, ecodes.KEY_LEFTCTRL),)
         
-        # Convert key names to evdev codes
-        self.SUPER_KEYS = {KEY_MAP.get(trigger_key, ecodes.KEY_LEFTMETA)}
-        self.TRIGGER_KEYS = [KEY_MAP.get(injection_key, ecodes.KEY_LEFTCTRL)]
+        # Prebuild the injected press/release sequences (keys + SYN_REPORT) so
+        # each is a single write to the uinput fd
+        self._inject_press_bytes = b"".join(
+            INPUT_EVENT.pack(0, 0, _EV_KEY, key, 1) for key in self._trigger_keys_tuple
+        ) + _SYN_REPORT_BYTES
+        self._inject_release_bytes = b"".join(
+            INPUT_EVENT.pack(0, 0, _EV_KEY, key, 0) for key in reversed(self._trigger_keys_tuple)
+        ) + _SYN_REPORT_BYTES
+        self._tap_timeout_ns = int(self.tap_timeout * 1_000_000_000)
         
-        print(f"Listening for: {trigger_key}")
-        print(f"Will inject: {injection_key}")
-        print(f"Tap timeout: {self.tap_timeout}s")
+        logger.info("Listening for: %s", trigger_key)
+        logger.info("Will inject: %s", injection_key)
+        logger.info("Tap timeout: %ss", self.tap_timeout)
     
-    def is_valid_device(self, device):
-        """Check if a device should be monitored."""
+    def apply_cpu_affinity(self):
+        """Pin the daemon to the configured CPUs to keep its hot state cache-warm."""
+        if not self.cpu_affinity:
+            return
+        try:
+            # Called before any threads exist, so the whole process inherits it
+            os.sched_setaffinity(0, self.cpu_affinity)
+            logger.info("Pinned to CPU(s): %s", ", ".join(map(str, sorted(self.cpu_affinity))))
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("Could not set CPU affinity %s: %s", self.cpu_affinity, e)
+    
+    def _close_device(self, device):
+        """Close a device, ignoring errors from already-gone devices."""
+        try:
+            device.close()
+        except:
+            pass
+    
+    def _classify_device(self, device):
+        """Return (valid, dtype): whether to monitor a device and its type.
+        
+        Results are remembered per hardware identity, so a device that
+        reconnects (e.g. Bluetooth after wake) is not classified again.
+        """
+        try:
+            info = device.info
+            key = (info.vendor, info.product, info.bustype, info.version,
+                   device.name, device.phys)
+        except (PermissionError, OSError):
+            return False, "Unknown"
+        
+        cached = self._device_class_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        result = self._classify_device_uncached(device)
+        if result[1] != "Unknown":
+            if len(self._device_class_cache) >= self.DEVICE_CLASS_CACHE_SIZE:
+                # Evict the oldest entry (dicts keep insertion order)
+                del self._device_class_cache[next(iter(self._device_class_cache))]
+            self._device_class_cache[key] = result
+        return result
+    
+    def _classify_device_uncached(self, device):
+        """Classify a device by its name, bus and capabilities."""
         try:
-            name = device.name
-            
             # FILTER: Ignore our own device
-            if name == "Super Activity Daemon":
-                return False
+            if device.phys == UINPUT_PHYS:
+                return False, "Virtual"
+            
+            name = device.name
 
             # FILTER: Ignore Tiling Shell Proxy (Masquerades as USB)
             if "Tiling Shell Proxy Device" in name:
-                return False
+                return False, "Virtual"
             
             # FILTER: Ignore BUS_VIRTUAL (0x06)
             if device.info.bustype == 0x06:
-                return False
+                return False, "Virtual"
                 
             caps = device.capabilities()
+            keys = caps.get(_EV_KEY, [])
+            has_letters = _KEY_A in keys
             
             # Check for Keyboard-like
-            is_keyboard = False
-            if ecodes.EV_KEY in caps:
-                keys = caps[ecodes.EV_KEY]
-                if ecodes.KEY_A in keys and ecodes.KEY_SPACE in keys:
-                    is_keyboard = True
+            is_keyboard = has_letters and _KEY_SPACE in keys
             
             # Check for Mouse-like
-            is_mouse = ecodes.EV_REL in caps
+            is_mouse = _EV_REL in caps
             
-            return is_keyboard or is_mouse
+            if has_letters and is_mouse:
+                dtype = "Combo"
+            elif has_letters:
+                dtype = "Keyboard"
+            else:
+                dtype = "Mouse/Other"
+            
+            return is_keyboard or is_mouse, dtype
         except (PermissionError, OSError):
-            return False
+            return False, "Unknown"
     
-    def get_device_type(self, device):
-        """Get a human-readable device type."""
-        try:
-            caps = device.capabilities()
-            is_keyboard = ecodes.EV_KEY in caps and ecodes.KEY_A in caps.get(ecodes.EV_KEY, [])
-            is_mouse = ecodes.EV_REL in caps
-            if is_keyboard and is_mouse:
-                return "Combo"
-            elif is_keyboard:
-                return "Keyboard"
-            else:
-                return "Mouse/Other"
-        except:
-            return "Unknown"
+    def find_input_devices(self, exclude=frozenset()):
+        """Find keyboards and mice (filtering out virtual devices).
         
-    def find_input_devices(self):
-        """Find keyboards and mice (filtering out virtual devices)."""
+        Paths in exclude (e.g. devices already being monitored) are not
+        reopened; only newly found devices are returned.
+        """
         input_devices = {}
-        for path in evdev.list_devices():
+        try:
+            paths = [e.path for e in os.scandir("/dev/input") if e.name.startswith("event")]
+        except OSError:
+            paths = []
+        for path in paths:
+            if path in exclude:
+                continue
+            # Skip power buttons, lid switches etc. without opening them
+            if not may_be_input_device(path):
+                continue
             try:
                 device = evdev.InputDevice(path)
-                if self.is_valid_device(device):
+                valid, dtype = self._classify_device(device)
+                if valid:
                     input_devices[path] = device
-                    dtype = self.get_device_type(device)
-                    print(f"Found {dtype}: {device.name} ({device.path})")
+                    logger.info("Found %s: %s (%s)", dtype, device.name, device.path)
                 else:
-                    device.close()
+                    self._close_device(device)
             except (PermissionError, OSError):
                 pass
         return input_devices
@@ -208,111 +401,115 @@ class SuperActivityDaemon:
         if not self.ui:
             return
 
-        print("Triggering Activity View (Injecting logical Super)...")
+        logger.info("Triggering Activity View (Injecting logical Super)...")
         try:
-            for key in self.TRIGGER_KEYS:
-                self.ui.write(ecodes.EV_KEY, key, 1)
-            self.ui.syn()
+            os.write(self.ui.fd, self._inject_press_bytes)
             await asyncio.sleep(0.05)
-            for key in reversed(self.TRIGGER_KEYS):
-                self.ui.write(ecodes.EV_KEY, key, 0)
-            self.ui.syn()
+            os.write(self.ui.fd, self._inject_release_bytes)
         except OSError as e:
-            print(f"Failed to inject keys: {e}")
+            logger.error("Failed to inject keys: %s", e)
     
-    async def handle_event(self, event):
+    def handle_event(self, event: "evdev.InputEvent") -> None:
         """Handle a single input event."""
+        event_type: int = event.type
+        key_code: int
+        key_state: int
+        
+        # Fast path: only key events matter until SUPER is held
+        if not self.super_pressed and event_type != _EV_KEY:
+            return
         
         # 1. Handle Key Events
-        if event.type == ecodes.EV_KEY:
+        if event_type == _EV_KEY:
             key_code = event.code
             key_state = event.value  # 0=release, 1=press, 2=repeat
             
             # Handle SUPER key events
-            if key_code in self.SUPER_KEYS:
+            if key_code == self._super_key_code:
                 if key_state == 1:  # Press
                     self.super_pressed = True
-                    self.super_press_time = time.time()
+                    self.super_press_time = self._now()
                     self.other_key_pressed = False
-                    print(f"SUPER pressed ({ecodes.KEY.get(key_code)}) - tracking started")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("SUPER pressed (%s) - tracking started", ecodes.KEY.get(key_code))
                     
                 elif key_state == 0:  # Release
                     if self.super_pressed:
-                        elapsed = time.time() - self.super_press_time
+                        elapsed_ns = self._now() - self.super_press_time
                         
-                        if not self.other_key_pressed and elapsed < self.tap_timeout:
-                            print(f"Clean SUPER tap detected ({elapsed:.3f}s)")
-                            await self.trigger_activity_view()
+                        if not self.other_key_pressed and elapsed_ns < self._tap_timeout_ns:
+                            logger.debug("Clean SUPER tap detected (%.3fs)", elapsed_ns / 1e9)
+                            self._trigger_task = asyncio.get_running_loop().create_task(
+                                self.trigger_activity_view()
+                            )
                         else:
                             cause = "other action" if self.other_key_pressed else "held too long"
-                            print(f"SUPER release ignored ({cause})")
+                            logger.debug("SUPER release ignored (%s)", cause)
                         
                         self.super_pressed = False
                         self.other_key_pressed = False
                         
-            # Handle OTHER keys while SUPER is held
-            elif self.super_pressed:
-                if key_state == 1: # On Press
+            # Handle OTHER key presses while SUPER is held
+            elif self.super_pressed and key_state == 1:
+                self.other_key_pressed = True
+                if logger.isEnabledFor(logging.DEBUG):
                     key_name = ecodes.KEY.get(key_code) or ecodes.BTN.get(key_code) or f"CODE_{key_code}"
-                    print(f"Interaction detected (Key/Btn): {key_name} - Activity View negated")
-                    self.other_key_pressed = True
+                    logger.debug("Interaction detected (Key/Btn): %s - Activity View negated", key_name)
 
-        # 2. Handle Relative Events (Mouse Scroll)
-        elif event.type == ecodes.EV_REL and self.super_pressed:
-            if event.code in [ecodes.REL_WHEEL, ecodes.REL_HWHEEL]:
+        # 2. Handle Relative Events (Mouse Scroll) - SUPER is held here
+        elif event_type == _EV_REL:
+            if event.code == _REL_WHEEL or event.code == _REL_HWHEEL:
                 if event.value != 0:
-                    print("Interaction detected (Scroll) - Activity View negated")
                     self.other_key_pressed = True
+                    logger.debug("Interaction detected (Scroll) - Activity View negated")
     
-    async def monitor_device(self, device):
-        """Monitor a single device for events."""
-        path = device.path
+    def monitor_device(self, device):
+        """Start monitoring a single device for events."""
+        asyncio.get_running_loop().add_reader(device.fd, self._drain_device, device)
+    
+    def _drain_device(self, device):
+        """Handle every event already queued on a readable device."""
         try:
-            async for event in device.async_read_loop():
-                await self.handle_event(event)
-        except OSError as e:
-            print(f"Device disconnected: {device.name} ({path})")
-        finally:
-            # Clean up disconnected device
-            if path in self.devices:
-                del self.devices[path]
-            if path in self.device_tasks:
-                del self.device_tasks[path]
-            try:
-                device.close()
-            except:
-                pass
+            for event in device.read():
+                self.handle_event(event)
+        except BlockingIOError:
+            pass
+        except OSError:
+            logger.info("Device disconnected: %s (%s)", device.name, device.path)
+            self.remove_device(device.path)
+    
+    def _unwatch_device(self, device):
+        """Stop monitoring a device and close it."""
+        try:
+            asyncio.get_running_loop().remove_reader(device.fd)
+        except (OSError, ValueError):
+            pass
+        self._close_device(device)
     
     def add_device(self, path):
         """Add a new device to monitoring."""
         if path in self.devices:
             return  # Already monitoring
+        if not may_be_input_device(path):
+            return
         
         try:
             device = evdev.InputDevice(path)
-            if self.is_valid_device(device):
+            valid, dtype = self._classify_device(device)
+            if valid:
                 self.devices[path] = device
-                task = asyncio.create_task(self.monitor_device(device))
-                self.device_tasks[path] = task
-                dtype = self.get_device_type(device)
-                print(f"Hotplug: Added {dtype}: {device.name} ({path})")
+                self.monitor_device(device)
+                logger.info("Hotplug: Added %s: %s (%s)", dtype, device.name, path)
             else:
-                device.close()
+                self._close_device(device)
         except (PermissionError, OSError, FileNotFoundError):
             pass
     
     def remove_device(self, path):
         """Remove a device from monitoring."""
-        if path in self.device_tasks:
-            self.device_tasks[path].cancel()
-            del self.device_tasks[path]
         if path in self.devices:
-            try:
-                self.devices[path].close()
-            except:
-                pass
-            del self.devices[path]
-            print(f"Hotplug: Removed device at {path}")
+            self._unwatch_device(self.devices.pop(path))
+            logger.info("Hotplug: Removed device at %s", path)
     
     async def watch_devices_pyudev(self):
         """Watch for device changes using pyudev."""
@@ -320,93 +517,127 @@ class SuperActivityDaemon:
         monitor = pyudev.Monitor.from_netlink(context)
         monitor.filter_by(subsystem='input')
         
-        # Make the monitor non-blocking
         monitor.start()
         
-        print("Device hotplug monitoring enabled (pyudev)")
-        
-        loop = asyncio.get_event_loop()
+        logger.info("Device hotplug monitoring enabled (pyudev)")
         
-        while self.running:
-            # Run blocking poll in executor to not block the event loop
-            device = await loop.run_in_executor(None, lambda: monitor.poll(timeout=1.0))
+        # Wake only when the netlink socket has data, instead of polling
+        loop = asyncio.get_running_loop()
+        fd = monitor.fileno()
+        loop.add_reader(fd, self._on_udev_readable, monitor)
+        try:
+            await self._shutdown.wait()
+        finally:
+            loop.remove_reader(fd)
+    
+    def _on_udev_readable(self, monitor):
+        """Drain pending udev events without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            device = monitor.poll(timeout=0)
             if device is None:
-                continue
-                
+                break
+            
             # Only care about event devices
             if device.device_node and device.device_node.startswith('/dev/input/event'):
                 if device.action == 'add':
                     # Small delay to let device initialize
-                    await asyncio.sleep(0.5)
-                    self.add_device(device.device_node)
+                    loop.call_later(0.5, self.add_device, device.device_node)
                 elif device.action == 'remove':
                     self.remove_device(device.device_node)
     
-    async def watch_devices_poll(self):
-        """Fallback: periodically scan for new devices."""
-        print(f"Device hotplug monitoring enabled (polling every {self.DEVICE_SCAN_INTERVAL}s)")
+    async def watch_devices_inotify(self):
+        """Fallback: watch /dev/input for device nodes using inotify."""
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            logger.warning("Device hotplug monitoring disabled: %s", os.strerror(ctypes.get_errno()))
+            return
         
-        while self.running:
-            await asyncio.sleep(self.DEVICE_SCAN_INTERVAL)
+        try:
+            if libc.inotify_add_watch(fd, b"/dev/input", IN_CREATE | IN_DELETE) < 0:
+                logger.warning("Device hotplug monitoring disabled: %s", os.strerror(ctypes.get_errno()))
+                return
             
-            # Find current devices
-            current_paths = set(evdev.list_devices())
-            monitored_paths = set(self.devices.keys())
+            logger.info("Device hotplug monitoring enabled (inotify)")
             
-            # Add new devices
-            for path in current_paths - monitored_paths:
-                self.add_device(path)
+            loop = asyncio.get_running_loop()
+            loop.add_reader(fd, self._on_inotify_readable, fd)
+            try:
+                await self._shutdown.wait()
+            finally:
+                loop.remove_reader(fd)
+        finally:
+            os.close(fd)
+    
+    def _on_inotify_readable(self, fd):
+        """Drain pending inotify events for /dev/input."""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                buf = os.read(fd, 4096)
+            except BlockingIOError:
+                break
             
-            # Remove stale devices (handled by monitor_device when they disconnect)
+            offset = 0
+            while offset < len(buf):
+                _, mask, _, name_len = INOTIFY_EVENT.unpack_from(buf, offset)
+                offset += INOTIFY_EVENT.size
+                name = buf[offset:offset + name_len].rstrip(b"\0").decode()
+                offset += name_len
+                
+                # Only care about event devices
+                if not name.startswith("event"):
+                    continue
+                path = f"/dev/input/{name}"
+                if mask & IN_CREATE:
+                    # Small delay to let udev set up permissions
+                    loop.call_later(0.5, self.add_device, path)
+                elif mask & IN_DELETE:
+                    self.remove_device(path)
     
     async def run(self):
         """Main run loop with dynamic device management."""
-        print("Super Activity View Daemon starting (with hotplug support)...")
-        self.running = True
+        logger.info("Super Activity View Daemon starting (with hotplug support)...")
+        
+        # Sleep until a signal asks us to stop, without periodic wakeups
+        self._shutdown = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._shutdown.set)
         
-        # Find initial devices
-        self.devices = self.find_input_devices()
+        # Find initial devices, keeping any that are already open
+        new_devices = self.find_input_devices(exclude=self.devices.keys())
+        self.devices.update(new_devices)
         
         if not self.devices:
-            print("No input devices found! Will wait for devices to be connected...")
+            logger.warning("No input devices found! Will wait for devices to be connected...")
         
-        # Start monitoring existing devices
-        for path, device in self.devices.items():
-            task = asyncio.create_task(self.monitor_device(device))
-            self.device_tasks[path] = task
+        # Start monitoring newly found devices
+        for device in new_devices.values():
+            self.monitor_device(device)
         
         # Start device hotplug watcher
         if HAVE_PYUDEV:
             hotplug_task = asyncio.create_task(self.watch_devices_pyudev())
         else:
-            hotplug_task = asyncio.create_task(self.watch_devices_poll())
+            hotplug_task = asyncio.create_task(self.watch_devices_inotify())
         
         try:
-            # Keep running until cancelled
-            while self.running:
-                await asyncio.sleep(1)
-                
-                # If we have no devices, keep waiting
-                if not self.devices:
-                    continue
+            await self._shutdown.wait()
+            logger.info("Shutting down...")
         except asyncio.CancelledError:
-            print("Shutting down...")
+            logger.info("Shutting down...")
         finally:
-            self.running = False
+            self._shutdown.set()
             hotplug_task.cancel()
+            await asyncio.gather(hotplug_task, return_exceptions=True)
             
-            # Cancel all device tasks
-            for task in self.device_tasks.values():
-                task.cancel()
-            
-            # Close all devices
+            # Stop monitoring and close all devices
             if self.ui:
                 self.ui.close()
             for device in self.devices.values():
-                try:
-                    device.close()
-                except:
-                    pass
+                self._unwatch_device(device)
 
 def main():
     daemon = SuperActivityDaemon()
@@ -415,7 +646,7 @@ def main():
     except KeyboardInterrupt:
         pass
     except PermissionError:
-        print("Permission denied. Run with sudo.")
+        logger.error("Permission denied. Run with sudo.")
         sys.exit(1)
 
 if __name__ == "__main__":